@@ -1,55 +1,218 @@
 import json
 import asyncio
+import base64
+import binascii
+import contextlib
+import functools
+import importlib.util
 import os
-from datetime import datetime
 import random
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import NamedTuple
+
+try:
+    import httpx
+except ImportError: # Not installable in the mocked environment; HTTP paths stay disabled
+    httpx = None
+
+# httpx needs h2 for http2=True and raises at client creation without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+try:
+    import aiohttp # WebSocket price stream only; httpx has no WebSocket client
+except ImportError:
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError: # Fall back to stdlib json with identical wire output
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError: # Fall back to scalar random draws in MockMarketData
+    np = None
+
+try:
+    from numba import njit, prange
+except ImportError: # Arbitrage kernel runs as plain Python
+    njit = None
+
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+    _json_loads = json.loads
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+logger = logging.getLogger("defi")
+logger.setLevel(logging.INFO)
+
+# --- Quote Model ---
+
+@dataclass(slots=True)
+class QuoteView:
+    """A quote with its hot fields pre-extracted; amounts are integers in base units."""
+    exchange: str
+    in_mint: str
+    out_mint: str
+    in_amount: int
+    out_amount: int
+    min_out: int
+    slippage_bps: int
+    price_impact_pct: str = "0"
+    route_plan: list = field(default_factory=list)
+    context_slot: int = 0
+    time_taken: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict, exchange: str) -> "QuoteView":
+        """Parse a Jupiter-style quote response at the API boundary."""
+        return cls(
+            exchange=exchange,
+            in_mint=data["inputMint"],
+            out_mint=data["outputMint"],
+            in_amount=int(data["inAmount"]),
+            out_amount=int(data["outAmount"]),
+            min_out=int(data["otherAmountThreshold"]),
+            slippage_bps=data["slippageBps"],
+            price_impact_pct=data.get("priceImpactPct", "0"),
+            route_plan=data.get("routePlan", []),
+            context_slot=data.get("contextSlot", 0),
+            time_taken=data.get("timeTaken", 0.0)
+        )
+
+    def to_dict(self) -> dict:
+        """Jupiter-style quote response, as expected in a swap-transaction request body."""
+        return {
+            "inputMint": self.in_mint,
+            "inAmount": str(self.in_amount),
+            "outputMint": self.out_mint,
+            "outAmount": str(self.out_amount),
+            "otherAmountThreshold": str(self.min_out),
+            "swapMode": "ExactIn",
+            "slippageBps": self.slippage_bps,
+            "priceImpactPct": self.price_impact_pct,
+            "routePlan": self.route_plan,
+            "contextSlot": self.context_slot,
+            "timeTaken": self.time_taken
+        }
 
 # --- Mock Data and API Interactions (due to environment limitations) ---
 
 class MockMarketData:
     def __init__(self):
-        self._prices = {
-            SOL_MINT: 170.0, # Base SOL price
-            USDC_MINT: 1.0,   # USDC is stable
-            RAY_MINT: 0.5    # Base RAY price
-        }
+        self._stable_prices = {USDC_MINT: 1.0} # USDC is stable
+        # Volatile mints are kept as parallel vectors so one tick draws every fluctuation at once
+        self._mints = [SOL_MINT, RAY_MINT]
+        self._mint_index = {mint: idx for idx, mint in enumerate(self._mints)}
+        base_prices = [170.0, 0.5] # Base SOL and RAY prices
+        max_percent_changes = [0.001, 0.005] # SOL moves up to 0.1% per tick, RAY up to 0.5%
+        if np is not None:
+            self._rng = np.random.default_rng()
+            self._prices_vec = np.array(base_prices)
+            self._max_pct = np.array(max_percent_changes)
+        else:
+            self._rng = random.Random()
+            self._prices_vec = base_prices
+            self._max_pct = max_percent_changes
         self._apys = {
             "Jupiter_SOL-USDC": 0.05, # 5% APY
             "Raydium_SOL-USDC": 0.04  # 4% APY
         }
-        self._last_update = datetime.now()
-
-    def _simulate_fluctuation(self, mint: str, max_percent_change=0.005): # 0.5% fluctuation
-        current_price = self._prices[mint]
-        if (datetime.now() - self._last_update).total_seconds() > 5: # Update every 5 seconds
-            change = current_price * (random.uniform(-max_percent_change, max_percent_change))
-            self._prices[mint] = current_price + change
-            # Update _last_update only once per cycle to keep prices consistent for a cycle
-            if mint == list(self._prices.keys())[0]: # Only update once for the first mint processed
-                self._last_update = datetime.now()
-        return self._prices[mint]
+        self._last_update = time.monotonic()
+        self._started_at = self._last_update
+        # TTL caches: key -> (value, expiry on the time.monotonic() clock)
+        self._price_cache: dict[str, tuple[float, float]] = {}
+        self._apy_cache: dict[tuple[str, str], tuple[float, float]] = {}
+
+    def _simulate_fluctuation(self):
+        now = time.monotonic()
+        if now - self._last_update <= 5: # Update every 5 seconds
+            return
+        # All mints move together so prices stay consistent within a cycle
+        self._last_update = now
+        if np is not None:
+            self._prices_vec += self._rng.uniform(-self._max_pct, self._max_pct) * self._prices_vec
+        else:
+            # One getrandbits call yields up to four 64-bit uniforms, so draw mints four at a time
+            prices = self._prices_vec
+            for start in range(0, len(prices), 4):
+                count = min(4, len(prices) - start)
+                bits = self._rng.getrandbits(64 * count)
+                for idx in range(start, start + count):
+                    r = (bits & 0xFFFFFFFFFFFFFFFF) * 2.0 ** -64 # Uniform in [0, 1)
+                    bits >>= 64
+                    prices[idx] += (2 * r - 1) * self._max_pct[idx] * prices[idx]
 
     async def get_price(self, mint: str) -> float:
-        if mint == USDC_MINT:
-            return self._prices[mint]
-        elif mint in self._prices:
-            return self._simulate_fluctuation(mint, max_percent_change=0.001 if mint == SOL_MINT else 0.005)
-        return 0.0 # Unknown mint
+        now = time.monotonic()
+        cached = self._price_cache.get(mint)
+        if cached is not None and now < cached[1]:
+            return cached[0]
+
+        idx = self._mint_index.get(mint)
+        if idx is not None:
+            self._simulate_fluctuation()
+            price = float(self._prices_vec[idx])
+        elif mint in self._stable_prices:
+            price = self._stable_prices[mint]
+        else:
+            return 0.0 # Unknown mint
+        self._price_cache[mint] = (price, now + PRICE_CACHE_TTL_SECONDS)
+        return price
 
     async def get_liquidity_pool_apy(self, exchange_name: str, pair: str) -> float:
+        now = time.monotonic()
+        key = (exchange_name, pair)
+        cached = self._apy_cache.get(key)
+        if cached is not None and now < cached[1]:
+            return cached[0]
+
         # Simulate APY fluctuations, favoring one exchange occasionally
         base_apy = self._apys.get(f"{exchange_name}_{pair}", 0.03) # Default 3%
-        fluctuation = random.uniform(-0.01, 0.02) # -1% to +2%
+        fluctuation = float(self._rng.uniform(-0.01, 0.02)) # -1% to +2%
         simulated_apy = max(0.01, base_apy + fluctuation) # Ensure APY is at least 1%
+        self._apy_cache[key] = (simulated_apy, now + APY_CACHE_TTL_SECONDS)
         return simulated_apy
 
+    def set_price(self, mint: str, price: float):
+        """Apply a pushed price update; it is authoritative, so it also refreshes the cache."""
+        idx = self._mint_index.get(mint)
+        if idx is not None:
+            self._prices_vec[idx] = price
+        elif mint in self._stable_prices:
+            self._stable_prices[mint] = price
+        else:
+            return # Ignore mints we don't track
+        self._price_cache[mint] = (price, time.monotonic() + PRICE_CACHE_TTL_SECONDS)
+
+    def current_slot(self) -> int:
+        """Simulated Solana slot, advancing every SLOT_DURATION_SECONDS like mainnet."""
+        return MOCK_GENESIS_SLOT + int((time.monotonic() - self._started_at) / SLOT_DURATION_SECONDS)
+
+    def cleanup_expired(self):
+        """Drop expired price and APY cache entries so stale keys don't accumulate."""
+        now = time.monotonic()
+        for cache in (self._price_cache, self._apy_cache):
+            for key in [key for key, (_, expiry) in cache.items() if expiry <= now]:
+                del cache[key]
+
 class MockJupiterAPI:
-    def __init__(self, market_data: MockMarketData):
+    def __init__(self, market_data: MockMarketData, client=None):
         self.market_data = market_data
+        self.client = client # Shared HTTP/2 httpx.AsyncClient owned by main()
         self.name = "Jupiter"
+        self.rpc_url = None # JSON-RPC quote endpoint; None keeps quotes in-process (mock)
 
-    async def get_quote(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int) -> dict:
-        print(f"[MOCK-{self.name}] Getting quote for {amount} of {input_mint} to {output_mint} with {slippage_bps} slippage.", flush=True)
+    async def get_quote(self, input_mint: str, output_mint: str, amount: int, slippage_bps: int) -> QuoteView:
+        logger.info("[MOCK-%s] Getting quote for %s of %s to %s with %s slippage.", self.name, amount, input_mint, output_mint, slippage_bps)
         
         input_price = await self.market_data.get_price(input_mint)
         output_price = await self.market_data.get_price(output_mint)
@@ -57,7 +220,7 @@ class MockJupiterAPI:
         if input_price == 0 or output_price == 0:
             return None
 
-        input_amount_usd = (amount / (10 ** SOL_DECIMALS)) * input_price # Assuming input is SOL for now
+        input_amount_usd = (amount / SCALE[input_mint]) * input_price
         
         # Introduce slight difference for arbitrage opportunity
         if self.name == "Jupiter":
@@ -65,60 +228,120 @@ class MockJupiterAPI:
         else: # Raydium
             output_amount_usd_raw = input_amount_usd * (random.uniform(0.9996, 1.0000)) # Raydium gives slightly more
 
-        out_amount_base_units = int((output_amount_usd_raw / output_price) * (10 ** USDC_DECIMALS)) # Assuming output is USDC for now
+        out_amount_base_units = int((output_amount_usd_raw / output_price) * SCALE[output_mint])
 
         # Apply slippage
         min_out_amount_base_units = int(out_amount_base_units * (1 - (slippage_bps / 10000)))
 
-        return {
-            "inputMint": input_mint,
-            "inAmount": str(amount),
-            "outputMint": output_mint,
-            "outAmount": str(out_amount_base_units),
-            "otherAmountThreshold": str(min_out_amount_base_units),
-            "swapMode": "ExactIn",
-            "slippageBps": slippage_bps,
-            "priceImpactPct": "0.0001",
-            "routePlan": [],
-            "contextSlot": 0,
-            "timeTaken": 0.01
-        }
+        return QuoteView(
+            exchange=self.name,
+            in_mint=input_mint,
+            out_mint=output_mint,
+            in_amount=amount,
+            out_amount=out_amount_base_units,
+            min_out=min_out_amount_base_units,
+            slippage_bps=slippage_bps,
+            price_impact_pct="0.0001",
+            context_slot=self.market_data.current_slot(),
+            time_taken=0.01
+        )
         
-    async def get_swap_transaction(self, quote: dict, user_public_key: str) -> dict:
-        print(f"[MOCK-{self.name}] Generating swap transaction for quote: {quote['inputMint']} -> {quote['outputMint']}", flush=True)
+    async def get_swap_transaction(self, quote: QuoteView, user_public_key: str) -> dict:
+        logger.info("[MOCK-%s] Generating swap transaction for quote: %s -> %s", self.name, quote.in_mint, quote.out_mint)
         return {
-            "swapTransaction": f"mocked_base64_unsigned_transaction_from_{self.name}",
+            "swapTransaction": base64.b64encode(f"mocked_unsigned_transaction_from_{self.name}".encode()).decode("ascii"),
             "lastValidBlockHeight": 100000000,
             "prioritizationFeeLamports": 1000
         }
 
 class MockRaydiumAPI(MockJupiterAPI):
-    def __init__(self, market_data: MockMarketData):
-        super().__init__(market_data)
+    def __init__(self, market_data: MockMarketData, client=None):
+        super().__init__(market_data, client)
         self.name = "Raydium"
 
+@functools.cache
+def _resolved_config_path(config_path: str) -> str:
+    return os.path.expanduser(config_path)
+
+@functools.cache
+def _load_wallet_config(config_path: str) -> tuple[str | None, str | None]:
+    """Read (api_token, solana_address) once per path; later wallets reuse the parsed result."""
+    # Opening directly avoids an extra stat and the window between an exists() check and the read
+    try:
+        config = _json_loads(Path(config_path).read_bytes())
+    except FileNotFoundError:
+        return None, None
+    return config.get("apiToken"), config.get("solanaAddress")
+
 class MockAgentWallet:
-    def __init__(self, config_path="~/.agentwallet/config.json"):
-        self.config_path = os.path.expanduser(config_path)
+    def __init__(self, config_path="~/.agentwallet/config.json", client=None, rpc_url=None):
+        self.config_path = _resolved_config_path(config_path)
+        self.client = client # Shared httpx.AsyncClient owned by main()
+        self.rpc_url = rpc_url # Solana JSON-RPC endpoint; None keeps broadcasts mocked
         self.api_token = None
         self.solana_address = None
         self._load_config()
 
     def _load_config(self):
-        if os.path.exists(self.config_path):
-            with open(self.config_path, 'r') as f:
-                config = json.load(f)
-                self.api_token = config.get("apiToken")
-                self.solana_address = config.get("solanaAddress")
-        print(f"[MOCK] AgentWallet config loaded. Solana Address: {self.solana_address}", flush=True)
+        self.api_token, self.solana_address = _load_wallet_config(self.config_path)
+        logger.info("[MOCK] AgentWallet config loaded. Solana Address: %s", self.solana_address)
 
     async def send_raw_transaction(self, signed_transaction_base64: str):
-        print(f"[MOCK] Sending signed transaction: {signed_transaction_base64[:30]}...", flush=True)
+        logger.info("[MOCK] Sending signed transaction: %.30s...", signed_transaction_base64)
         # Simulate transaction broadcast
         return {"txHash": "mocked_transaction_hash_12345"}
 
+    def sign_transaction(self, unsigned_transaction: memoryview) -> bytes:
+        logger.info("[MOCK] Signing %s-byte transaction.", len(unsigned_transaction))
+        # Simulate signing; a real wallet would add the signature to the message
+        return bytes(unsigned_transaction)
+
+    async def send_raw_transactions_batch(self, signed_transactions: list[bytes]) -> list:
+        """Broadcast several signed transactions in one JSON-RPC batch; results follow input order."""
+        if self.client is None or self.rpc_url is None:
+            logger.info("[MOCK] Sending %s signed transactions in one batch.", len(signed_transactions))
+            # Simulate transaction broadcast
+            return [{"txHash": f"mocked_transaction_hash_{12345 + i}"} for i in range(len(signed_transactions))]
+
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "sendTransaction",
+                # Transactions travel as raw bytes and are base64-encoded exactly once, here
+                "params": [base64.b64encode(signed_transaction).decode("ascii"), {"encoding": "base64"}]
+            }
+            for i, signed_transaction in enumerate(signed_transactions)
+        ]
+        results = [None] * len(payload)
+        try:
+            resp = await self.client.post(self.rpc_url, content=_json_dumps(payload), headers=JSON_HEADERS)
+            resp.raise_for_status()
+            replies = _json_loads(resp.content)
+        except Exception as e:
+            logger.error("[ERROR] Transaction batch of %s to %s failed: %s", len(payload), self.rpc_url, e)
+            return results
+
+        # Match replies by id; a rejected batch comes back as a single error object
+        if isinstance(replies, dict):
+            replies = [replies]
+        if not isinstance(replies, list):
+            logger.error("[ERROR] Transaction batch reply from %s is not a JSON-RPC response", self.rpc_url)
+            return results
+        for reply in replies:
+            if not isinstance(reply, dict):
+                continue
+            request_id = reply.get("id")
+            if not isinstance(request_id, int) or not 0 <= request_id < len(results):
+                continue
+            if "error" in reply:
+                logger.error("[ERROR] Transaction %s rejected: %s", request_id, reply['error'])
+            else:
+                results[request_id] = {"txHash": reply.get("result")}
+        return results
+
     async def get_solana_balance(self):
-        print("[MOCK] Getting Solana balance.", flush=True)
+        logger.info("[MOCK] Getting Solana balance.")
         # Simulate fetching balance
         return 0.5 # Example: 0.5 SOL
 
@@ -129,147 +352,507 @@ RAY_MINT = "4k3Dyjzvzp8eMZWunexHQvE5dfQqj5ihYiqg5wsNFgsw" # Example Raydium Mint
 SOL_DECIMALS = 9
 USDC_DECIMALS = 6
 RAY_DECIMALS = 6
+# Base units per whole token, precomputed so hot paths skip the exponentiation
+SOL_SCALE = 10 ** SOL_DECIMALS
+RAY_SCALE = 10 ** RAY_DECIMALS
+# Per-mint lookups so quoting works for any supported pair
+DECIMALS: dict[str, int] = {SOL_MINT: SOL_DECIMALS, USDC_MINT: USDC_DECIMALS, RAY_MINT: RAY_DECIMALS}
+SCALE: dict[str, int] = {mint: 10 ** decimals for mint, decimals in DECIMALS.items()}
+SYMBOLS: dict[str, str] = {SOL_MINT: "SOL", USDC_MINT: "USDC", RAY_MINT: "RAY"}
+# Arbitrage topology: (input_mint, output_mint, amount_in_base_units); outputs are USD stablecoins
+TRADING_PAIRS = [
+    (SOL_MINT, USDC_MINT, int(0.1 * SOL_SCALE))
+]
+MIN_PROFIT_THRESHOLD_USD = 0.001
+QUOTE_SLIPPAGE_BPS = 100
+BUY_BACK_HEADROOM_BPS = 25 # Extra stablecoin spent on the buy leg to cover the buy exchange's spread
+PRICE_CACHE_TTL_SECONDS = 60
+APY_CACHE_TTL_SECONDS = 300 # APYs move far slower than prices
+CACHE_CLEANUP_INTERVAL_CYCLES = 10
+SOLANA_RPC_URL = os.environ.get("SOLANA_RPC_URL") # Unset keeps transaction broadcasts mocked
+SLOT_DURATION_SECONDS = 0.4 # Target Solana slot time
+MOCK_GENESIS_SLOT = 250_000_000 # Arbitrary starting slot for the mock chain
+HEARTBEAT_SECONDS = 10 # Run a cycle at least this often when no price events arrive
+PRICE_STREAM_URL = os.environ.get("PRICE_STREAM_URL") # WebSocket price feed; unset keeps heartbeat-only polling
+PRICE_STREAM_RECONNECT_SECONDS = 5
+MAX_QUOTE_BATCH_SIZE = 10 # Providers throttle or reject oversized JSON-RPC batches
+HTTP_MAX_CONNECTIONS = 32
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+# In-flight quote calls/batch POSTs per sweep, capped so each can reuse a kept-alive connection
+MAX_QUOTE_CONCURRENCY = HTTP_MAX_KEEPALIVE_CONNECTIONS
+
+# --- Arbitrage Kernel ---
+
+def _best_arb_py(buys, sells, threshold):
+    """Return (route, profit) for the route whose sell_out - buy_out most exceeds threshold, else (-1, threshold)."""
+    best = -1
+    best_profit = threshold
+    for i in range(len(buys)):
+        profit = sells[i] - buys[i]
+        if profit > best_profit:
+            best_profit = profit
+            best = i
+    return best, best_profit
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def best_arb(buys, sells, threshold):
+        # prange spreads the profit vector across cores; the argmax stays serial to avoid a racy reduction
+        profits = np.empty(len(buys), dtype=np.int64)
+        for i in prange(len(buys)):
+            profits[i] = sells[i] - buys[i]
+        best = -1
+        best_profit = threshold
+        for i in range(len(profits)):
+            if profits[i] > best_profit:
+                best_profit = profits[i]
+                best = i
+        return best, best_profit
+
+    # Compile now (or load from cache) rather than inside the first live trading cycle
+    best_arb(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 0)
+else:
+    best_arb = _best_arb_py
+
+def build_route_collector(num_exchanges: int, pairs: list) -> tuple[list, object]:
+    """Generate a straight-line route evaluator for a fixed exchange x pair topology.
+
+    Returns (routes, collect_routes). routes[r] is (pair_idx, buy_back_idx, sell_idx) into the pair-major
+    quote list built by StrategyEngine: forward (token -> stablecoin) quotes first, then the reverse
+    (stablecoin -> token) buy-back quotes at the same offsets shifted by len(pairs) * num_exchanges.
+    Each route is scored on the two legs it would actually send: the stablecoin it receives from the sell
+    leg against the stablecoin the buy-back spends. collect_routes(quotes) returns the (buys, sells) tuples
+    for best_arb, with each pair's profit threshold folded into buys so the kernel runs with a zero
+    threshold. A route whose buy-back is missing or would not re-acquire the full sold amount gets buy=1,
+    sell=0 and can never be selected.
+    """
+    routes = []
+    num_forward = len(pairs) * num_exchanges
+    num_quotes = 2 * num_forward
+    lines = ["def collect_routes(quotes):"]
+    if num_quotes:
+        lines.append("    " + "".join(f"q{i}, " for i in range(num_quotes)) + "= quotes")
+    for pair_idx, (_, output_mint, amount) in enumerate(pairs):
+        threshold = int(MIN_PROFIT_THRESHOLD_USD * SCALE[output_mint])
+        for buy in range(num_exchanges):
+            for sell in range(num_exchanges):
+                if buy == sell:
+                    continue
+                b = num_forward + pair_idx * num_exchanges + buy
+                s = pair_idx * num_exchanges + sell
+                r = len(routes)
+                routes.append((pair_idx, b, s))
+                lines.append(f"    if q{s} is not None and q{b} is not None and q{b}.out_amount >= {amount}:")
+                lines.append(f"        b{r} = q{b}.in_amount + {threshold}")
+                lines.append(f"        s{r} = q{s}.out_amount")
+                lines.append("    else:")
+                lines.append(f"        b{r} = 1")
+                lines.append(f"        s{r} = 0")
+    buys = "".join(f"b{r}, " for r in range(len(routes)))
+    sells = "".join(f"s{r}, " for r in range(len(routes)))
+    lines.append(f"    return ({buys}), ({sells})")
+
+    namespace = {}
+    exec(compile("\n".join(lines) + "\n", "<route_collector>", "exec"), namespace)
+    return routes, namespace["collect_routes"]
+
+# --- Quote Batching ---
+
+class QuoteBatch:
+    """Collects quote requests and sends them as JSON-RPC batches, one POST per endpoint chunk."""
+
+    def __init__(self, max_batch_size: int = MAX_QUOTE_BATCH_SIZE, max_concurrency: int = MAX_QUOTE_CONCURRENCY):
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self._requests = []
+
+    def add(self, exchange: MockJupiterAPI, input_mint: str, output_mint: str, amount: int, slippage_bps: int) -> int:
+        self._requests.append((exchange, input_mint, output_mint, amount, slippage_bps))
+        return len(self._requests) - 1 # Index of this quote in the execute() result list
+
+    async def execute(self, client) -> list:
+        results = [None] * len(self._requests)
+        local_ids = []
+        ids_by_endpoint = {}
+        for request_id, (exchange, *_) in enumerate(self._requests):
+            if client is None or exchange.rpc_url is None:
+                local_ids.append(request_id)
+            else:
+                ids_by_endpoint.setdefault(exchange.rpc_url, []).append(request_id)
+
+        # Fan everything out at once, bounding in-flight calls; each task fills its own result slots
+        # and handles its own errors, so one failure never cancels its siblings
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with asyncio.TaskGroup() as tg:
+            for request_id in local_ids:
+                tg.create_task(self._get_local_quote(request_id, results, semaphore))
+            for url, ids in ids_by_endpoint.items():
+                for start in range(0, len(ids), self.max_batch_size):
+                    tg.create_task(self._post_batch(client, url, ids[start:start + self.max_batch_size], results, semaphore))
+        return results
+
+    async def _get_local_quote(self, request_id: int, results: list, semaphore: asyncio.Semaphore):
+        exchange, input_mint, output_mint, amount, slippage_bps = self._requests[request_id]
+        try:
+            async with semaphore:
+                results[request_id] = await exchange.get_quote(input_mint, output_mint, amount, slippage_bps)
+        except Exception as e:
+            logger.error("[ERROR] %s quote failed: %s", exchange.name, e)
+
+    async def _post_batch(self, client, url: str, ids: list, results: list, semaphore: asyncio.Semaphore):
+        payload = []
+        for request_id in ids:
+            exchange, input_mint, output_mint, amount, slippage_bps = self._requests[request_id]
+            payload.append({
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "getQuote",
+                "params": {
+                    "exchange": exchange.name,
+                    "inputMint": input_mint,
+                    "outputMint": output_mint,
+                    "amount": str(amount),
+                    "slippageBps": slippage_bps
+                }
+            })
+        try:
+            async with semaphore:
+                resp = await client.post(url, content=_json_dumps(payload), headers=JSON_HEADERS)
+            resp.raise_for_status()
+            replies = _json_loads(resp.content)
+        except Exception as e:
+            logger.error("[ERROR] Quote batch of %s to %s failed: %s", len(ids), url, e)
+            return
+
+        # Per JSON-RPC 2.0, replies may arrive in any order and a rejected batch is a single error object
+        if isinstance(replies, dict):
+            replies = [replies]
+        if not isinstance(replies, list):
+            logger.error("[ERROR] Quote batch reply from %s is not a JSON-RPC response", url)
+            return
+        expected = set(ids)
+        for reply in replies:
+            if not isinstance(reply, dict):
+                continue
+            request_id = reply.get("id")
+            if request_id not in expected:
+                continue
+            if "error" in reply:
+                logger.error("[ERROR] Quote %s rejected by %s: %s", request_id, url, reply['error'])
+            else:
+                try:
+                    results[request_id] = QuoteView.from_dict(reply["result"], self._requests[request_id][0].name)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error("[ERROR] Quote %s from %s is malformed: %s", request_id, url, e)
 
 # --- Strategy Logic ---
 
 async def check_yield_farming_opportunity(market_data: MockMarketData):
-    print(f"[{datetime.now().isoformat()}] Checking yield farming opportunities...", flush=True)
+    logger.info("Checking yield farming opportunities...")
     
     # Simulate APYs for SOL-USDC pools on different exchanges
-    jupiter_apy = await market_data.get_liquidity_pool_apy("Jupiter", "SOL-USDC")
-    raydium_apy = await market_data.get_liquidity_pool_apy("Raydium", "SOL-USDC")
+    jupiter_apy, raydium_apy = await asyncio.gather(
+        market_data.get_liquidity_pool_apy("Jupiter", "SOL-USDC"),
+        market_data.get_liquidity_pool_apy("Raydium", "SOL-USDC"),
+    )
 
     apy_threshold = 0.005 # 0.5% APY difference for opportunity
 
     if jupiter_apy > raydium_apy + apy_threshold:
-        print(f"[OPPORTUNITY] Yield Farming: Jupiter SOL-USDC offers higher APY ({jupiter_apy:.2%} vs {raydium_apy:.2%})", flush=True)
         return {
             "type": "yield_farming",
             "pair": "SOL-USDC",
             "exchange": "Jupiter",
-            "apy": jupiter_apy
+            "apy": jupiter_apy,
+            "otherApy": raydium_apy
         }
     elif raydium_apy > jupiter_apy + apy_threshold:
-        print(f"[OPPORTUNITY] Yield Farming: Raydium SOL-USDC offers higher APY ({raydium_apy:.2%} vs {jupiter_apy:.2%})", flush=True)
         return {
             "type": "yield_farming",
             "pair": "SOL-USDC",
             "exchange": "Raydium",
-            "apy": raydium_apy
+            "apy": raydium_apy,
+            "otherApy": jupiter_apy
         }
     return None
 
-async def identify_opportunity(jupiter_api: MockJupiterAPI, raydium_api: MockRaydiumAPI, market_data: MockMarketData):
-    print(f"[{datetime.now().isoformat()}] Identifying DeFi opportunities...", flush=True)
-    
-    # Check for arbitrage opportunity first
-    amount_to_swap_sol = 0.1 
-    amount_to_swap_lamports = int(amount_to_swap_sol * (10 ** SOL_DECIMALS))
-    min_profit_threshold_usd = 0.001 
-
-    jupiter_quote = await jupiter_api.get_quote(SOL_MINT, USDC_MINT, amount_to_swap_lamports, 100)
-    raydium_quote = await raydium_api.get_quote(SOL_MINT, USDC_MINT, amount_to_swap_lamports, 100)
+class StrategyEngine:
+    """Detects opportunities, evaluating at most once per Solana slot.
 
-    if jupiter_quote and raydium_quote:
-        jupiter_out_usdc = float(jupiter_quote['outAmount']) / (10**USDC_DECIMALS)
-        raydium_out_usdc = float(raydium_quote['outAmount']) / (10**USDC_DECIMALS)
+    The slot memo is checked before any quote I/O. A repeat call within an evaluated slot returns None,
+    because that slot's opportunity was already handed out for execution. Pushed price updates call
+    invalidate(), so the next cycle re-quotes even if the slot has not advanced. A push that lands while
+    quotes are in flight also keeps that cycle from being memoized.
+    """
 
-        if raydium_out_usdc > jupiter_out_usdc + min_profit_threshold_usd:
-            profit_usd = raydium_out_usdc - jupiter_out_usdc
-            print(f"[OPPORTUNITY] Arbitrage detected (Raydium offers more USDC for SOL): {profit_usd:.6f} USDC profit", flush=True)
-            return {
-                "type": "arbitrage",
-                "inputMint": SOL_MINT,
-                "outputMint": USDC_MINT,
-                "amountIn": amount_to_swap_lamports,
-                "buyExchange": "Jupiter", 
-                "sellExchange": "Raydium",
-                "profitUsdc": profit_usd,
-                "buyQuote": jupiter_quote, 
-                "sellQuote": raydium_quote 
-            }
-        elif jupiter_out_usdc > raydium_out_usdc + min_profit_threshold_usd:
-            profit_usd = jupiter_out_usdc - raydium_out_usdc
-            print(f"[OPPORTUNITY] Arbitrage detected (Jupiter offers more USDC for SOL): {profit_usd:.6f} USDC profit", flush=True)
+    def __init__(self, exchanges: list, market_data: MockMarketData, pairs: list):
+        self.market_data = market_data
+        self._generation = 0 # Bumped by invalidate(); a cycle only memoizes if it is unchanged
+        self.set_topology(exchanges, pairs)
+
+    def set_topology(self, exchanges: list, pairs: list):
+        """Regenerate the specialized route evaluator; call again whenever exchanges or pairs change."""
+        self.exchanges = list(exchanges)
+        self.pairs = list(pairs)
+        self._routes, self._collect_routes = build_route_collector(len(self.exchanges), self.pairs)
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the memoized slot so the next call re-quotes."""
+        self._generation += 1
+        self._last_slot = -1
+
+    async def identify_opportunity(self):
+        slot = self.market_data.current_slot()
+        if slot == self._last_slot:
+            return None # Already evaluated (and handed out) this slot
+        generation = self._generation # Read before any I/O so a mid-cycle invalidate() is noticed
+        logger.info("Identifying DeFi opportunities...")
+    
+        # Check for arbitrage opportunity first; quotes are laid out pair-major, one per exchange.
+        # Forward quotes sell the token; reverse quotes buy the same token amount back for the buy leg
+        buy_back_amounts = await asyncio.gather(*(self._buy_back_amount(*pair) for pair in self.pairs))
+        batch = QuoteBatch()
+        for input_mint, output_mint, amount in self.pairs:
+            for exchange in self.exchanges:
+                batch.add(exchange, input_mint, output_mint, amount, QUOTE_SLIPPAGE_BPS)
+        for (input_mint, output_mint, _), buy_back_amount in zip(self.pairs, buy_back_amounts):
+            for exchange in self.exchanges:
+                batch.add(exchange, output_mint, input_mint, buy_back_amount, QUOTE_SLIPPAGE_BPS)
+
+        # Quotes and the yield check are independent, so issue them as one wave
+        quotes, yield_opportunity = await asyncio.gather(
+            batch.execute(self.exchanges[0].client), # All exchanges share one client
+            check_yield_farming_opportunity(self.market_data),
+            return_exceptions=True,
+        )
+        # A failed call is treated the same as a missing quote/opportunity
+        if isinstance(quotes, Exception):
+            quotes = [None] * (2 * len(self.pairs) * len(self.exchanges))
+        if isinstance(yield_opportunity, Exception):
+            yield_opportunity = None
+
+        opportunity = self._evaluate(quotes, yield_opportunity)
+        # A price push during the quotes means this result is already stale; don't memoize it
+        if self._generation == generation:
+            self._last_slot = slot
+        return opportunity
+
+    async def _buy_back_amount(self, input_mint: str, output_mint: str, amount: int) -> int:
+        """Stablecoin base units to spend buying back `amount` of input_mint.
+
+        Sized at market price plus BUY_BACK_HEADROOM_BPS so the buy exchange's spread doesn't leave the bot
+        short; routes whose buy-back still returns less than `amount` are rejected by the route collector.
+        """
+        input_price, output_price = await asyncio.gather(
+            self.market_data.get_price(input_mint),
+            self.market_data.get_price(output_mint)
+        )
+        if input_price == 0 or output_price == 0:
+            return 0 # The forward quotes will be missing too, so no route uses this
+        market_value = (amount / SCALE[input_mint]) * input_price / output_price * SCALE[output_mint]
+        return int(market_value * (1 + BUY_BACK_HEADROOM_BPS / 10000))
+
+    def _evaluate(self, quotes: list, yield_opportunity):
+        buys, sells = self._collect_routes(quotes)
+        if njit is not None:
+            buys = np.array(buys, dtype=np.int64)
+            sells = np.array(sells, dtype=np.int64)
+        best, _ = best_arb(buys, sells, 0) # Thresholds are already folded into buys
+
+        if best >= 0:
+            pair_idx, buy_back_idx, sell_idx = self._routes[best]
+            input_mint, output_mint, amount = self.pairs[pair_idx]
+            buy_back_quote = quotes[buy_back_idx]
+            sell_quote = quotes[sell_idx]
+            # Profit of the two legs actually sent; any token surplus from the buy-back headroom is not counted
+            profit_usd = (sell_quote.out_amount - buy_back_quote.in_amount) / SCALE[output_mint] # Float only for reporting
+            output_symbol = SYMBOLS[output_mint]
+            logger.info("[OPPORTUNITY] Arbitrage detected (%s offers more %s for %s): %.6f %s profit", sell_quote.exchange, output_symbol, SYMBOLS[input_mint], profit_usd, output_symbol)
             return {
                 "type": "arbitrage",
-                "inputMint": SOL_MINT,
-                "outputMint": USDC_MINT,
-                "amountIn": amount_to_swap_lamports,
-                "buyExchange": "Raydium", 
-                "sellExchange": "Jupiter",
+                "inputMint": input_mint,
+                "outputMint": output_mint,
+                "amountIn": amount,
+                "buyExchange": buy_back_quote.exchange, 
+                "sellExchange": sell_quote.exchange,
                 "profitUsdc": profit_usd,
-                "buyQuote": raydium_quote, 
-                "sellQuote": jupiter_quote 
+                "buyQuote": buy_back_quote, # Stablecoin -> token, re-acquiring what the sell leg sells
+                "sellQuote": sell_quote 
             }
     
-    # If no arbitrage, check for yield farming opportunity
-    yield_opportunity = await check_yield_farming_opportunity(market_data)
-    if yield_opportunity:
-        return yield_opportunity
+        # If no arbitrage, fall back to the yield farming opportunity; it is only reported once it wins,
+        # since the check runs alongside the quotes every cycle
+        if yield_opportunity:
+            logger.info("[OPPORTUNITY] Yield Farming: %s %s offers higher APY (%.2f%% vs %.2f%%)", yield_opportunity['exchange'], yield_opportunity['pair'], yield_opportunity['apy'] * 100, yield_opportunity['otherApy'] * 100)
+            return yield_opportunity
 
-    print("[OPPORTUNITY] No profitable arbitrage or yield farming opportunity identified (mocked).", flush=True)
-    return None
+        logger.info("[OPPORTUNITY] No profitable arbitrage or yield farming opportunity identified (mocked).")
+        return None
 
 async def execute_strategy(opportunity: dict, agent_wallet: MockAgentWallet, jupiter_api: MockJupiterAPI, raydium_api: MockRaydiumAPI):
-    print(f"[{datetime.now().isoformat()}] Executing strategy: {opportunity['type']}", flush=True)
+    logger.info("Executing strategy: %s", opportunity['type'])
 
     user_public_key = agent_wallet.solana_address
     if not user_public_key:
-        print("[ERROR] AgentWallet Solana address not found. Cannot execute strategy.", flush=True)
+        logger.error("[ERROR] AgentWallet Solana address not found. Cannot execute strategy.")
         return
 
     if opportunity['type'] == "arbitrage":
-        print(f"[EXECUTE] Performing {opportunity['type']} on {opportunity['buyExchange']} then {opportunity['sellExchange']}. Profit: {opportunity['profitUsdc']:.6f} USDC", flush=True)
+        logger.info("[EXECUTE] Performing %s on %s then %s. Profit: %.6f %s", opportunity['type'], opportunity['buyExchange'], opportunity['sellExchange'], opportunity['profitUsdc'], SYMBOLS[opportunity['outputMint']])
         
-        exchange_for_execution = None
-        if opportunity['sellExchange'] == "Jupiter":
-            exchange_for_execution = jupiter_api
-        elif opportunity['sellExchange'] == "Raydium":
-            exchange_for_execution = raydium_api
+        exchanges = {jupiter_api.name: jupiter_api, raydium_api.name: raydium_api}
+        buy_exchange = exchanges.get(opportunity['buyExchange'])
+        sell_exchange = exchanges.get(opportunity['sellExchange'])
         
-        if exchange_for_execution:
-            unsigned_transaction_response = await exchange_for_execution.get_swap_transaction(
-                opportunity['sellQuote'], user_public_key
+        if buy_exchange and sell_exchange:
+            # Both legs are independent until broadcast, so build them concurrently
+            buy_response, sell_response = await asyncio.gather(
+                buy_exchange.get_swap_transaction(opportunity['buyQuote'], user_public_key),
+                sell_exchange.get_swap_transaction(opportunity['sellQuote'], user_public_key)
             )
-            unsigned_transaction_base64 = unsigned_transaction_response.get("swapTransaction")
-
-            if not unsigned_transaction_base64:
-                print(f"[ERROR] Failed to get unsigned transaction from {exchange_for_execution.name}.", flush=True)
-                return
-            
-            print(f"[MOCK] Transaction generated for {exchange_for_execution.name}. In a real scenario, this would be signed and sent.", flush=True)
+            legs = []
+            for exchange, response in ((buy_exchange, buy_response), (sell_exchange, sell_response)):
+                unsigned_transaction_base64 = response.get("swapTransaction")
+                if not unsigned_transaction_base64:
+                    logger.error("[ERROR] Failed to get unsigned transaction from %s.", exchange.name)
+                    return
+                # Decode once at the boundary; signing and sending then work on the raw bytes
+                try:
+                    legs.append((exchange, base64.b64decode(unsigned_transaction_base64, validate=True)))
+                except binascii.Error as e:
+                    logger.error("[ERROR] Invalid transaction encoding from %s: %s", exchange.name, e)
+                    return
+
+            # Send both legs in one batch to keep their execution window as tight as possible
+            signed_transactions = [agent_wallet.sign_transaction(memoryview(unsigned)) for _, unsigned in legs]
+            results = await agent_wallet.send_raw_transactions_batch(signed_transactions)
+            for (exchange, _), result in zip(legs, results):
+                if result is None:
+                    logger.error("[ERROR] %s leg was not accepted.", exchange.name)
+                else:
+                    logger.info("[EXECUTE] %s leg sent: %s", exchange.name, result['txHash'])
         else:
-            print("[ERROR] No valid exchange found for execution in mock.", flush=True)
+            logger.error("[ERROR] No valid exchange found for execution in mock.")
     elif opportunity['type'] == "yield_farming":
-        print(f"[EXECUTE] Deploying capital for yield farming on {opportunity['exchange']} for {opportunity['pair']} with APY: {opportunity['apy']:.2%}", flush=True)
+        logger.info("[EXECUTE] Deploying capital for yield farming on %s for %s with APY: %.2f%%", opportunity['exchange'], opportunity['pair'], opportunity['apy'] * 100)
         # In a real scenario, this would involve:
         # 1. Swapping tokens to the correct pair ratio (e.g., SOL and USDC)
         # 2. Depositing liquidity into the specified pool on the chosen exchange
-        print("[MOCK] Simulated capital deployment for yield farming.", flush=True)
+        logger.info("[MOCK] Simulated capital deployment for yield farming.")
     else:
-        print(f"[EXECUTE] Unknown opportunity type: {opportunity['type']}", flush=True)
+        logger.info("[EXECUTE] Unknown opportunity type: %s", opportunity['type'])
 
-async def main():
-    print("Starting Solana DeFi Strategy Optimizer (Mocked Environment)", flush=True)
+# --- Price Stream ---
 
-    # Initialize mock APIs
-    market_data = MockMarketData()
-    jupiter_api = MockJupiterAPI(market_data)
-    raydium_api = MockRaydiumAPI(market_data)
-    agent_wallet = MockAgentWallet()
+class PriceUpdate(NamedTuple):
+    mint: str
+    price: float
 
-    # Main loop for strategy execution
+async def price_event_loop(session, ws_url: str, queue: asyncio.Queue):
+    """Push PriceUpdate tuples from a WebSocket price feed into queue, reconnecting on failure."""
     while True:
-        # Pass both Jupiter and Raydium APIs and market data for opportunity detection
-        opportunity = await identify_opportunity(jupiter_api, raydium_api, market_data)
-        if opportunity:
-            await execute_strategy(opportunity, agent_wallet, jupiter_api, raydium_api)
-        else:
-            print("No opportunities found. Waiting...", flush=True)
+        try:
+            async with session.ws_connect(ws_url, heartbeat=30) as ws:
+                logger.info("[STREAM] Connected to price stream %s", ws_url)
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.ERROR:
+                        break
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        continue
+                    try:
+                        data = _json_loads(msg.data)
+                        await queue.put(PriceUpdate(data["mint"], float(data["price"])))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.error("[ERROR] Malformed price event %.80s: %s", msg.data, e)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("[ERROR] Price stream %s failed: %s", ws_url, e)
+        await asyncio.sleep(PRICE_STREAM_RECONNECT_SECONDS)
+
+async def apply_price_updates(queue: asyncio.Queue, market_data: MockMarketData, engine: StrategyEngine, wakeup: asyncio.Event):
+    """Apply pushed prices as they arrive and wake the strategy loop for an immediate cycle."""
+    while True:
+        update = await queue.get()
+        market_data.set_price(update.mint, update.price)
+        engine.invalidate() # A push can land mid-slot; don't let the slot memo hide it
+        wakeup.set()
+
+@contextlib.asynccontextmanager
+async def open_http_client():
+    """Yield one AsyncClient for all exchange traffic, or None when httpx is unavailable.
+
+    The client speaks HTTP/2 when h2 is installed and falls back to HTTP/1.1 keep-alive otherwise.
+    """
+    if httpx is None:
+        yield None
+        return
+    if not HTTP2_AVAILABLE:
+        logger.info("[HTTP] h2 not installed; exchange client falls back to HTTP/1.1")
+    # HTTP/2 multiplexes concurrent requests as streams over one connection per host
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS)
+    async with httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=limits) as client:
+        yield client
+
+@contextlib.asynccontextmanager
+async def open_http_session():
+    """Yield an aiohttp ClientSession for the price stream, or None when aiohttp is unavailable."""
+    if aiohttp is None:
+        yield None
+        return
+    # The session only carries the one long-lived WebSocket, so the default connector is enough
+    async with aiohttp.ClientSession() as session:
+        yield session
 
-        # Simulate waiting for next cycle
-        await asyncio.sleep(10) # Wait for 10 seconds before next check (mock)
+async def main():
+    logger.info("Starting Solana DeFi Strategy Optimizer (Mocked Environment)")
+
+    async with open_http_client() as client, open_http_session() as session:
+        # Initialize mock APIs
+        market_data = MockMarketData()
+        jupiter_api = MockJupiterAPI(market_data, client)
+        raydium_api = MockRaydiumAPI(market_data, client)
+        agent_wallet = MockAgentWallet(client=client, rpc_url=SOLANA_RPC_URL)
+        # The evaluator is specialized to this topology once, up front
+        engine = StrategyEngine([jupiter_api, raydium_api], market_data, TRADING_PAIRS)
+
+        # Price pushes wake the loop early; without a stream it runs on the heartbeat alone
+        price_updates = asyncio.Queue()
+        wakeup = asyncio.Event()
+        background_tasks = []
+        if session is not None and PRICE_STREAM_URL:
+            background_tasks.append(asyncio.create_task(price_event_loop(session, PRICE_STREAM_URL, price_updates)))
+            background_tasks.append(asyncio.create_task(apply_price_updates(price_updates, market_data, engine, wakeup)))
+
+        try:
+            # Main loop for strategy execution
+            cycle = 0
+            next_deadline = time.monotonic()
+            while True:
+                cycle += 1
+                if cycle % CACHE_CLEANUP_INTERVAL_CYCLES == 0:
+                    market_data.cleanup_expired()
+
+                # Pass both Jupiter and Raydium APIs and market data for opportunity detection
+                opportunity = await engine.identify_opportunity()
+                if opportunity:
+                    await execute_strategy(opportunity, agent_wallet, jupiter_api, raydium_api)
+                else:
+                    logger.info("No opportunities found. Waiting...")
+
+                # Heartbeats stay on a fixed monotonic grid so cycle time doesn't accumulate as drift;
+                # ticks missed during a long cycle are skipped rather than run back-to-back
+                now = time.monotonic()
+                while next_deadline <= now:
+                    next_deadline += HEARTBEAT_SECONDS
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=next_deadline - now)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear() # Pushes that arrived during the cycle collapse into this one wakeup
+        finally:
+            for task in background_tasks:
+                task.cancel()
 
 if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(message)s")
     asyncio.run(main())